@@ -4,70 +4,586 @@
 # Copyright (C) 2024-2025 Paul Minner, Peter Mao, Caltech
 
 import json
+import os
+import socket
 import sys
-import argparse
+from types import SimpleNamespace
+
+try: # much faster json encoding, if available
+    import orjson
+except ImportError:
+    orjson = None
+
+# CLI flags of the queries, in order of precedence, and the command
+# names used for them by `dispatch', --batch and the daemon.
+QUERY_FLAGS = {'--get-fields'   : 'get_fields',
+               '--get-attrs'    : 'get_attrs',
+               '--preview-field': 'preview_field',
+               '--read-dataset' : 'read_dataset',
+               '--is-group'     : 'is_group',
+               '--is-field'     : 'is_field'}
+COMMANDS = tuple(QUERY_FLAGS.values())
+
+# CLI flags that take no argument.
+OPTION_FLAGS = ('--fast', '--batch', '--no-daemon')
+
+USAGE = """\
+usage: h5parse.py filepath [--get-fields GROUP] [--get-attrs FIELD]
+                  [--preview-field FIELD] [--read-dataset DATASET]
+                  [--is-group FIELD] [--is-field FIELD] [--fast]
+                  [--processes N] [--batch] [--no-daemon]
+"""
+
+HELP = USAGE + """
+  filepath               File to parse
+  --get-fields GROUP     Print fields within group
+  --get-attrs FIELD      Print attributes of parent to root
+  --preview-field FIELD  Print preview of requested field
+  --read-dataset DATASET Print dataset data
+  --is-group FIELD       Print true if field is group
+  --is-field FIELD       Print true if field exists in file
+  --fast                 Skip the data range in --get-fields
+  --processes N          Compute --get-fields ranges in this many processes
+  --batch                Answer json queries read line by line from stdin
+  --no-daemon            Do not try to use a running h5parse_daemon.py
+"""
+
+def dumps_json(obj, indent: bool = False) -> bytes:
+    """Encode OBJ as UTF-8 json, with orjson if it is installed."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None).encode()
+
+def socket_path() -> str:
+    """Path of the Unix socket served by h5parse_daemon.py."""
+    rundir = os.environ.get('XDG_RUNTIME_DIR')
+    if rundir:
+        return os.path.join(rundir, 'hdf5-viewer.sock')
+    return os.path.join('/tmp', f'hdf5-viewer-{os.getuid()}.sock')
+
+def query_daemon(filename: str, cmd: str, arg: str, fast: bool = False):
+    """Send one query to a running daemon.
+
+    Return the daemon's response, or None if no daemon is listening."""
+    request = {'cmd': cmd, 'file': os.path.realpath(filename), 'arg': arg,
+               'fast': fast}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path())
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            with sock.makefile('rb') as stream:
+                line = stream.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    return json.loads(line)
+
+def usage_error(message: str):
+    """Exit after reporting a command line error, like argparse."""
+    sys.stderr.write(USAGE)
+    sys.stderr.write(f"h5parse.py: error: {message}\n")
+    sys.exit(2)
+
+def parse_args(argv: list) -> SimpleNamespace:
+    """Parse command line ARGV, without the cost of importing argparse.
+
+    The returned query is the (command, argument) of the first query
+    flag given, in QUERY_FLAGS order, or None."""
+    args = SimpleNamespace(filepath=None, fast=False, batch=False,
+                           no_daemon=False, processes=0)
+    queries = {}
+    tokens = iter(argv)
+    for token in tokens:
+        flag, equals, value = token.partition('=')
+        if token in ('-h', '--help'):
+            sys.stdout.write(HELP)
+            sys.exit(0)
+        elif flag in QUERY_FLAGS or flag == '--processes':
+            if not equals:
+                value = next(tokens, None)
+                if value is None:
+                    usage_error(f"argument {flag}: expected one argument")
+            if flag == '--processes':
+                try:
+                    args.processes = int(value)
+                except ValueError:
+                    usage_error(f"argument --processes: invalid int value: '{value}'")
+            else:
+                queries[QUERY_FLAGS[flag]] = value
+        elif token in OPTION_FLAGS:
+            setattr(args, token[2:].replace('-', '_'), True)
+        elif token.startswith('-') or args.filepath is not None:
+            usage_error(f"unrecognized arguments: {token}")
+        else:
+            args.filepath = token
+    if args.filepath is None:
+        usage_error("the following arguments are required: filepath")
+    args.query = next(((cmd, queries[cmd]) for cmd in COMMANDS
+                       if queries.get(cmd)), None)
+    return args
+
+def write_result(cmd: str, result):
+    """Print RESULT of query CMD as json."""
+    sys.stdout.buffer.write(dumps_json(result, indent=(cmd == 'get_fields')) + b"\n")
+
+def answer_from_daemon(args: SimpleNamespace) -> bool:
+    """Answer the query in ARGS with a running daemon, if there is one.
+    Return False if the query must be answered in-process."""
+    if args.query is None or args.batch or args.no_daemon or args.processes:
+        return False
+    cmd, arg = args.query
+    response = query_daemon(args.filepath, cmd, arg, args.fast)
+    if response is None:
+        return False
+    if 'error' in response:
+        sys.exit(response['error'])
+    write_result(cmd, response['result'])
+    return True
+
+if __name__ == "__main__":
+    # Try the daemon before importing numpy and h5py, which take most of
+    # the startup time.
+    ARGS = parse_args(sys.argv[1:])
+    if answer_from_daemon(ARGS):
+        sys.exit(0)
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import math
+import multiprocessing
+import posixpath
+import threading
 import numpy as np
 import h5py
-import warnings
 
-def meta_dict(obj) -> dict:
-    """Common function to collect metadata from HDF5 object."""
+try: # h5py's low-level reader, which skips the high-level slicing code
+    from h5py._selector import Reader
+except ImportError:
+    Reader = None
+
+# Number of elements reduced at a time by `nanminmax'.  A block stays
+# in cache between its min and its max, so the data is only streamed
+# from memory once.
+MINMAX_BLOCK = 1 << 16
+
+# Datasets of at least this many bytes have their range computed by a
+# multi-threaded Numba kernel, if Numba is installed and can run at
+# least NUMBA_MIN_THREADS threads.  The kernel's inner loop is slower
+# than NumPy's SIMD reductions, so it only pays off across several
+# cores, and for large enough data to amortize importing Numba.
+NUMBA_MIN_NBYTES  = 256 * 1024 * 1024
+NUMBA_MIN_THREADS = 4
+
+# Number of elements handled by each thread of the Numba kernel.
+NUMBA_BLOCK = 1 << 13
+
+_numba_kernel = None
+# The kernel runs its own threads; calls from several threads at once
+# are not safe under every Numba threading layer.
+_numba_lock = threading.Lock()
+# Held while the kernel is compiled, so that `get_fields' threads
+# reaching it together compile it only once.
+_numba_compile_lock = threading.Lock()
+
+def numba_nanminmax():
+    """Return the Numba range kernel, compiling it on first use.
+    Return None if Numba is missing or cannot use enough threads."""
+    global _numba_kernel
+    if _numba_kernel is None:
+        with _numba_compile_lock:
+            if _numba_kernel is None:
+                _numba_kernel = _compile_numba_nanminmax() or False
+    return _numba_kernel or None
+
+def _compile_numba_nanminmax():
+    try:
+        import numba
+    except ImportError:
+        return None
+    if numba.config.NUMBA_NUM_THREADS < NUMBA_MIN_THREADS:
+        return None
+
+    # every fast-math flag except 'nnan' and 'ninf', which would let
+    # the compiler drop the NaN checks
+    @numba.njit(parallel=True, cache=True,
+                fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+    def kernel(a):
+        """Return per-block mins and maxs of vector A, ignoring NaNs."""
+        nblocks = (a.size + NUMBA_BLOCK - 1) // NUMBA_BLOCK
+        mins = np.empty(nblocks, a.dtype)
+        maxs = np.empty(nblocks, a.dtype)
+        for b in numba.prange(nblocks):
+            start = b * NUMBA_BLOCK
+            stop = min(start + NUMBA_BLOCK, a.size)
+            mn = mx = a[start]
+            for i in range(start + 1, stop):
+                v = a[i]
+                # comparisons with NaN are false, so a NaN is only kept
+                # until the first number
+                if v < mn or mn != mn:
+                    mn = v
+                if v > mx or mx != mx:
+                    mx = v
+            mins[b] = mn
+            maxs[b] = mx
+        return mins, maxs
+    return kernel
+
+def nanminmax(datavec, kernel=None):
+    """Return the (min, max) of vector DATAVEC, ignoring NaNs.
+    Both are NaN if every element is NaN.
+
+    KERNEL, from `numba_nanminmax', is used for the integer and
+    float32/float64 types it supports."""
+    if kernel is not None and (datavec.dtype.kind in 'iu' or
+                               datavec.dtype in (np.float32, np.float64)):
+        with _numba_lock:
+            mins, maxs = kernel(np.ascontiguousarray(datavec))
+        return np.fmin.reduce(mins), np.fmax.reduce(maxs)
+    datamin = datamax = None
+    for start in range(0, len(datavec), MINMAX_BLOCK):
+        block = datavec[start:start + MINMAX_BLOCK]
+        blockmin = np.fmin.reduce(block)
+        blockmax = np.fmax.reduce(block)
+        if datamin is None:
+            datamin, datamax = blockmin, blockmax
+        else:
+            datamin = np.fmin(datamin, blockmin)
+            datamax = np.fmax(datamax, blockmax)
+    return datamin, datamax
+
+# Datasets larger than this many bytes are streamed through a buffer of
+# about this size by `dataset_range', rather than read in one go.
+SLAB_NBYTES = 1 << 20
+
+def range_slabs(obj: h5py.Dataset) -> tuple:
+    """Return (selections, size): the selections that `dataset_range'
+    reads Dataset OBJ in, and the largest number of elements in one.
+
+    Datasets with chunks of at least SLAB_NBYTES are read a chunk at a
+    time.  Others are read in blocks of at most SLAB_NBYTES, spanning
+    whole trailing axes where they fit, and made of whole chunks where
+    the dataset is chunked, so no chunk is split across two reads."""
+    unit = obj.chunks or (1,) * obj.ndim
+    if obj.chunks is not None:
+        chunksize = math.prod(obj.chunks)
+        if chunksize * obj.dtype.itemsize >= SLAB_NBYTES:
+            return obj.iter_chunks(), chunksize
+    budget = SLAB_NBYTES // obj.dtype.itemsize
+    # grow the block from one chunk, last axis first
+    block = list(unit)
+    for axis in reversed(range(obj.ndim)):
+        others = math.prod(block) // block[axis]
+        n = max(unit[axis], budget // others // unit[axis] * unit[axis])
+        block[axis] = min(n, obj.shape[axis])
+        if block[axis] < obj.shape[axis]:
+            break
+    starts = itertools.product(*(range(0, length, step)
+                                 for length, step in zip(obj.shape, block)))
+    slabs = (tuple(slice(i, min(i + step, length))
+                   for i, step, length in zip(start, block, obj.shape))
+             for start in starts)
+    return slabs, math.prod(block)
+
+def dataset_range(obj: h5py.Dataset):
+    """Return the (min, max) of Dataset OBJ, ignoring NaNs.
+
+    Large datasets are streamed through one reusable buffer, so memory
+    use stays bounded by SLAB_NBYTES, or one chunk if that is larger."""
+    if obj.ndim == 0 or obj.nbytes <= SLAB_NBYTES:
+        return nanminmax(np.asarray(read_data(obj)).reshape(-1))
+    kernel = numba_nanminmax() if obj.nbytes >= NUMBA_MIN_NBYTES else None
+    slabs, bufsize = range_slabs(obj)
+    buf = np.empty(bufsize, dtype=obj.dtype)
+    datamin = datamax = None
+    for sel in slabs:
+        shape = tuple(s.stop - s.start for s in sel)
+        size = math.prod(shape)
+        # contiguous view of the start of the buffer, so edge chunks and
+        # the last slab need no allocation either
+        obj.read_direct(buf[:size].reshape(shape), sel)
+        slabmin, slabmax = nanminmax(buf[:size], kernel)
+        if datamin is None:
+            datamin, datamax = slabmin, slabmax
+        else:
+            datamin = np.fmin(datamin, slabmin)
+            datamax = np.fmax(datamax, slabmax)
+    return datamin, datamax
+
+def attr_value(value):
+    """Return attribute VALUE for display: a string, or a number that
+    the json encoder writes natively.
+
+    Only arrays go through numpy's printing machinery."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, np.ndarray):
+        return np.array2string(value, threshold=64, max_line_width=45,
+                               separator=',')
+    if isinstance(value, np.generic) and (value.dtype.kind in 'iu' or
+                                          (value.dtype == np.float64 and
+                                           np.isfinite(value))):
+        return value.item()
+    # e.g. float32 prints at its own precision, and NaN and inf as
+    # strings, since json has no numbers for them
+    return str(value)
+
+def make_reader(obj: h5py.Dataset):
+    """Return a low-level Reader for numeric array Dataset OBJ.
+    Return None for other datasets, or if h5py has no Reader."""
+    if (Reader is None or obj.shape is None or obj.ndim == 0 or
+        obj.dtype.kind not in 'iuf'):
+        return None
+    try:
+        return Reader(obj.id)
+    except TypeError:
+        return None
+
+def read_data(obj: h5py.Dataset, shape: tuple = None, reader=None):
+    """Return the contents of Dataset OBJ, or only its leading block of
+    shape SHAPE.
+
+    Numeric arrays are read with READER, from `make_reader', if given.
+    Other arrays of fixed-size types are read straight into a
+    preallocated array, skipping h5py's general slicing machinery."""
+    if obj.shape is None or obj.ndim == 0:
+        return obj[()]
+    sel = tuple(slice(0, n) for n in shape) if shape else None
+    if reader is not None:
+        return reader.read(sel or ())
+    if obj.dtype.kind == 'O':
+        return obj[sel or ()]
+    buf = np.empty(shape or obj.shape, dtype=obj.dtype)
+    if buf.size > 0:
+        obj.read_direct(buf, sel)
+    return buf
+
+def shape_list(obj: h5py.Dataset):
+    """Return the shape of Dataset OBJ as a list, or None for scalars
+    and empty dataspaces."""
+    return list(obj.shape) if obj.shape else None
+
+# Numpy dtype kinds (bool, int, uint, float, complex) whose range is
+# shown.
+RANGE_KINDS = 'biufc'
+
+def range_str(obj: h5py.Dataset) -> str:
+    """Return the range of the data in Dataset OBJ for display."""
+    datarange = ""
+    # decide from the dtype alone, so strings, vlen and compound data
+    # are never read
+    if obj.shape is not None and obj.size > 0 and obj.dtype.kind in RANGE_KINDS:
+        try: # calculate the data range
+            # errstate is thread-local, unlike the warnings filters, so
+            # it is safe on `get_fields' worker threads
+            with np.errstate(invalid='ignore'):
+                datamin, datamax = dataset_range(obj)
+            if datamin != datamin: # NaN
+                datarange = 'nan'
+            elif datamin == datamax:
+                datarange = f'{datamin:.4g}'
+            else:
+                datarange = f'{datamin:.3g}:{datamax:.3g}'
+        except: # take the 1st value if it's something weird
+            datarange = str(obj[(0,) * obj.ndim])
+    return datarange
+
+# Threads computing dataset ranges in `get_fields'.  libhdf5 serializes
+# its calls, but the reductions release the GIL and the OS can read
+# ahead for several datasets at once.
+MAX_WORKERS = 4
+
+def range_dataset(f: h5py.File, path: str) -> h5py.Dataset:
+    """Open the Dataset at PATH in F with an RDCC_NBYTES chunk cache, for
+    computing its range.  A dataset that is already open elsewhere keeps
+    the cache it was first opened with."""
+    dapl = h5py.h5p.create(h5py.h5p.DATASET_ACCESS)
+    dapl.set_chunk_cache(RDCC_NSLOTS, RDCC_NBYTES, RDCC_W0)
+    return h5py.Dataset(h5py.h5d.open(f.id, path.encode(), dapl))
+
+_worker_file = None
+
+def _init_range_worker(filename: str):
+    """Open FILENAME in a `get_fields' worker process."""
+    global _worker_file
+    _worker_file = H5Instance(filename).instance
+
+def _range_worker(path: str) -> str:
+    return range_str(range_dataset(_worker_file, path))
+
+def meta_dict(obj, fast: bool = False) -> dict:
+    """Common function to collect metadata from HDF5 object.
+    If FAST, leave the range of a Dataset empty rather than read it."""
     if isinstance(obj, h5py.Group):
         meta = { 'type': 'group',
                  'name': obj.name,
                  # 'children': []
                 }
     elif isinstance(obj, h5py.Dataset):
-        shape = "scalar"
-        datarange = ""
-        dtype = "object" # h5py call non-numeric types object
-        data  = obj[()]
-        if hasattr(data, "dtype"):
-            dtype = str(data.dtype)
-        if (hasattr(data, "shape") and
-            data.shape is not None and
-            dtype != "object"):
-            datavec = data.reshape(-1) # data as a vector
-            if len(data.shape) > 0:
-                shape = str(data.shape)
-            if len(datavec) > 0: # Protect against empty datasets
-                try: # calculate the data range
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        datamin = np.nanmin(datavec)
-                        datamax = np.nanmax(datavec)
-                    if np.isnan(datamin):
-                        datarange = 'nan'
-                    elif datamin == datamax:
-                        datarange = f'{datamin:.4g}'
-                    else:
-                        datarange = f'{datamin:.3g}:{datamax:.3g}'
-                except: # take the 1st value if it's something weird
-                    datarange = str(datavec[0])
         meta =  {'type': 'dataset',
                  'name': obj.name,
-                 'shape': shape,
-                 'range': datarange,
-                 'dtype': dtype}
+                 'shape': shape_list(obj),
+                 'range': "" if fast else range_str(obj),
+                 'dtype': obj.dtype.str}
     else:
         raise Exception(f"'{obj.name}' is not a dataset or group")
     return meta
 
 
+# Number of elements along each axis read by `preview_field'.
+PREVIEW_ITEMS = 64
+
+# Raw data chunk cache for the short-lived dataset handles that ranges
+# are computed through, see `range_dataset'.  The number of hash slots
+# should be a prime well above the number of chunks in the cache, but
+# libhdf5 allocates the slot table as each dataset is opened, so it is
+# kept modest: 64 MB holds about 1000 chunks of 64 KB.
+RDCC_NBYTES = 64 * 1024 * 1024
+RDCC_NSLOTS = 10007
+RDCC_W0     = 0.75
+
+# Chunk cache for all other dataset handles.  Each open dataset holds
+# its cache until it is closed, so the daemon's --max-files instances,
+# each with OBJ_CACHE_SIZE datasets open, retain at most 32 * 8 * 1 MB.
+OBJ_RDCC_NBYTES = 1024 * 1024
+OBJ_RDCC_NSLOTS = 521
+
+# Number of recently used Groups and Datasets each H5Instance keeps open.
+OBJ_CACHE_SIZE = 8
+
+# With H5PARSE_CORE=1 in the environment, files smaller than this are
+# read into memory when opened (HDF5's core driver), so that later
+# queries, e.g. in the daemon, never touch the disk.
+CORE_MAX_BYTES = 512 * 1024 * 1024
+
+def obj_kind(obj) -> str:
+    """Classify h5py object OBJ as 'group', 'dataset', 'other' (e.g. a
+    named datatype) or 'missing' (None)."""
+    if obj is None:
+        return 'missing'
+    if isinstance(obj, h5py.Group):
+        return 'group'
+    if isinstance(obj, h5py.Dataset):
+        return 'dataset'
+    return 'other'
+
 class H5Instance:
     """Main class for parsing the HDF5 file."""
     def __init__(self, filename: str):
-        self.instance =  h5py.File(filename)
+        kwargs = {}
+        if (os.environ.get('H5PARSE_CORE') == '1' and
+            os.path.getsize(filename) < CORE_MAX_BYTES):
+            kwargs = {'driver': 'core', 'backing_store': False}
+        # Read-only access needs no file locks, which saves the locking
+        # syscalls (slow on network filesystems) and lets other programs
+        # write the file while it is open here.
+        self.instance =  h5py.File(filename, 'r', locking=False,
+                                   rdcc_nbytes=OBJ_RDCC_NBYTES,
+                                   rdcc_nslots=OBJ_RDCC_NSLOTS,
+                                   rdcc_w0=RDCC_W0, **kwargs)
+        # kinds of resolved paths, so that repeated queries skip the
+        # libhdf5 lookup
+        self._kinds: dict[str, str] = {}
+        # the OBJ_CACHE_SIZE most recently used objects, by path.  Each
+        # open dataset holds its own chunk cache, so not all are kept.
+        self._objs: OrderedDict[str, h5py.HLObject] = OrderedDict()
+        # low-level readers of the numeric datasets in _objs, by path
+        self._readers: dict[str, Reader] = {}
+
+    def close(self):
+        """Close the underlying HDF5 file."""
+        self._kinds.clear()
+        self._objs.clear()
+        self._readers.clear()
+        self.instance.close()
+
+    def _resolve(self, path: str) -> tuple:
+        """Return (kind, object) for PATH, with kind as in `obj_kind'."""
+        obj = self._objs.get(path)
+        if obj is not None:
+            self._objs.move_to_end(path)
+            return self._kinds[path], obj
+        obj = self.instance.get(path) # None for missing or dangling links
+        kind = self._kinds[path] = obj_kind(obj)
+        if kind in ('group', 'dataset'):
+            self._objs[path] = obj
+            if len(self._objs) > OBJ_CACHE_SIZE:
+                old, _ = self._objs.popitem(last=False)
+                self._readers.pop(old, None)
+        return kind, obj
+
+    def _kind(self, path: str) -> str:
+        """Return the kind of PATH, as in `obj_kind'."""
+        kind = self._kinds.get(path)
+        return kind if kind is not None else self._resolve(path)[0]
+
+    def _reader(self, path: str, obj: h5py.Dataset):
+        """Return the cached `make_reader' Reader for Dataset OBJ at PATH."""
+        if path not in self._readers:
+            self._readers[path] = make_reader(obj)
+        return self._readers[path]
+
+    def _range(self, path: str) -> str:
+        """Return `range_str' of the Dataset at PATH, through a handle
+        that is closed again afterwards, freeing its chunk cache."""
+        return range_str(range_dataset(self.instance, path))
 
-    def get_fields(self, root: str) -> dict:
-        """Get Groups and Datasets of the Group ROOT"""
-        if not self.is_group(root)["return"]:
+    def get_fields(self, root: str, fast: bool = False,
+                   processes: int = 0) -> dict:
+        """Get Groups and Datasets of the Group ROOT.
+
+        If FAST, skip reading the data for the range of each Dataset.
+        Ranges are computed by up to MAX_WORKERS threads, or by a pool of
+        PROCESSES processes that each open the file, if PROCESSES > 0."""
+        kind, obj = self._resolve(root)
+        if kind != 'group':
             raise Exception(f"'{root}' is not a group")
-        obj = self.instance[root]
+        # collect the children's metadata column by column, so the
+        # libhdf5 metadata lookups happen together before any data reads.
+        # No handles are kept: each open dataset holds its chunk cache.
+        names, kinds, fullnames, shapes, dtypes = [], [], [], {}, {}
+        for i, (cname, cobj) in enumerate(obj.items()):
+            ckind = obj_kind(cobj)
+            self._kinds[posixpath.join(root, cname)] = ckind
+            names.append(cname)
+            kinds.append(ckind)
+            fullnames.append(cobj.name if ckind in ('group', 'dataset') else None)
+            if ckind == 'dataset':
+                shapes[i] = shape_list(cobj)
+                dtypes[i] = cobj.dtype.str
+        cobj = None
+        datasets = list(shapes)
+        paths = [posixpath.join(root, names[i]) for i in datasets]
+        if fast:
+            ranges = {i: "" for i in datasets}
+        elif processes > 0:
+            with multiprocessing.get_context('spawn').Pool(
+                    processes, _init_range_worker, (self.instance.filename,)) as pool:
+                ranges = dict(zip(datasets, pool.map(_range_worker, paths)))
+        elif len(datasets) > 1:
+            with ThreadPoolExecutor(min(MAX_WORKERS, len(datasets))) as pool:
+                ranges = dict(zip(datasets, pool.map(self._range, paths)))
+        else:
+            ranges = {i: self._range(path) for i, path in zip(datasets, paths)}
+
         fields = {}
-        for cname, cobj in obj.items():
-            if cobj is not None:
-                fields[cname] = meta_dict(cobj)
+        for i, (cname, ckind, fullname) in enumerate(zip(names, kinds, fullnames)):
+            if ckind == 'group':
+                fields[cname] = {'type': 'group',
+                                 'name': fullname}
+            elif ckind == 'dataset':
+                fields[cname] = {'type': 'dataset',
+                                 'name': fullname,
+                                 'shape': shapes[i],
+                                 'range': ranges[i],
+                                 'dtype': dtypes[i]}
             else:
                 fields[cname] = {'type': 'other',
                                  'name': cname}
@@ -76,71 +592,89 @@ class H5Instance:
     def preview_field(self, field: str) -> dict:
         """If FIELD is a Group, return its sub-groups and sub-datasets.
         If FIELD is a Dataset, return the data."""
-        obj = self.instance[field]
-        meta = meta_dict(obj)
-        if isinstance(obj, h5py.Group):
+        kind, obj = self._resolve(field)
+        if kind == 'missing':
+            raise Exception(f"'{field}' is not a field")
+        # no range: it would read the whole dataset, not just the preview
+        meta = meta_dict(obj, fast=True)
+        if kind == 'group':
             # Return fields in group
             meta['data'] = str(list(obj.keys()))
         else:
-            # Return data in field
-            meta['data'] =  str(obj[()])
+            # Return the leading block of data in field
+            shape = obj.shape and tuple(min(n, PREVIEW_ITEMS) for n in obj.shape)
+            with np.printoptions(threshold=256, edgeitems=3):
+                meta['data'] = str(read_data(obj, shape, self._reader(field, obj)))
+            if shape != obj.shape:
+                meta['truncated'] = True
         return meta
 
     def read_dataset(self, field: str) -> dict:
         """Return metadata and data of FIELD, only for Datasets."""
-        obj = self.instance[field]
-        if not isinstance(obj, h5py.Dataset):
+        kind, obj = self._resolve(field)
+        if kind != 'dataset':
             raise Exception("Argument to --read-dataset must be a Dataset.")
-        meta = meta_dict(obj)
-        np.set_printoptions(threshold=sys.maxsize, linewidth=sys.maxsize)
-        meta['data'] = str(obj[()])
+        meta = meta_dict(obj, fast=True)
+        with np.printoptions(threshold=sys.maxsize, linewidth=sys.maxsize):
+            meta['data'] = str(read_data(obj, reader=self._reader(field, obj)))
         return meta
 
     def is_group(self, field: str) -> dict:
         """True for Groups.  False otherwise."""
-        true_or_false = False
-        if self.is_field(field)["return"]:
-            obj = self.instance[field]
-            if isinstance(obj, h5py.Group):
-                return {"return": True}
-        return {"return": true_or_false}
+        return {"return": self._kind(field) == 'group'}
 
     def is_field(self, field: str) -> dict:
         """True for Groups and Datasets. False otherwise, in particular for Attributes."""
-        true_or_false = field in self.instance
-        return {"return": true_or_false}
+        return {"return": self._kind(field) != 'missing'}
 
     def get_attrs(self, root: str) -> dict:
         """Return attributes of Group or Dataset"""
-        if not self.is_field(root)["return"]:
+        kind, obj = self._resolve(root)
+        if kind == 'missing':
             raise Exception("Argument to --get-attrs must be a Group or Dataset.")
-        obj = self.instance[root]
-        np.set_printoptions(linewidth=45)
-        return {x[0]:str(x[1]) for x in obj.attrs.items()}
+        return {name: attr_value(value) for name, value in obj.attrs.items()}
+
+# H5Instance query methods by command name.
+DISPATCH = {cmd: getattr(H5Instance, cmd) for cmd in COMMANDS}
+
+def dispatch(inst: H5Instance, cmd: str, arg: str, fast: bool = False,
+             processes: int = 0) -> dict:
+    """Run query CMD with argument ARG against INST.
+    FAST and PROCESSES are passed on to get_fields."""
+    method = DISPATCH.get(cmd)
+    if method is None:
+        raise Exception(f"Unknown command '{cmd}'")
+    if cmd == 'get_fields':
+        return method(inst, arg, fast, processes)
+    return method(inst, arg)
+
+def run_batch(inst: H5Instance, requests, output):
+    """Answer each line of json in REQUESTS with a line of json on binary
+    stream OUTPUT.
+
+    Requests look like {"cmd": "get_fields", "arg": "/group"}, with an
+    optional "fast": true, and are answered with {"result": ...} or
+    {"error": "message"}."""
+    for line in requests:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            response = {'result': dispatch(inst, request['cmd'], request['arg'],
+                                           request.get('fast', False))}
+        except Exception as err:
+            response = {'error': f"{type(err).__name__}: {err}"}
+        output.write(dumps_json(response) + b"\n")
+        output.flush()
+
+def main(args: SimpleNamespace):
+    """Answer the query in ARGS in-process."""
+    if args.batch:
+        run_batch(H5Instance(args.filepath), sys.stdin, sys.stdout.buffer)
+    elif args.query is not None:
+        cmd, arg = args.query
+        write_result(cmd, dispatch(H5Instance(args.filepath), cmd, arg,
+                                   args.fast, args.processes))
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument('filepath'       , type=str, help='File to parse')
-    parser.add_argument('--get-fields'   , type=str, help='Print fields within group')
-    parser.add_argument('--get-attrs'    , type=str, help='Print attributes of parent to root')
-    parser.add_argument('--preview-field', type=str, help='Print preview of requested field')
-    parser.add_argument('--read-dataset' , type=str, help='Print dataset data')
-    parser.add_argument('--is-group'     , type=str, help='Print true if field is group')
-    parser.add_argument('--is-field'     , type=str, help='Print true if field exists in file')
-    args = parser.parse_args()
-
-    inst = H5Instance(args.filepath)
-
-    if args.get_fields:
-        print(json.dumps(inst.get_fields(args.get_fields), indent=4))
-    elif args.get_attrs:
-        print(json.dumps(inst.get_attrs(args.get_attrs)))
-    elif args.preview_field:
-        print(json.dumps(inst.preview_field(args.preview_field)))
-    elif args.read_dataset:
-        print(json.dumps(inst.read_dataset(args.read_dataset)))
-    elif args.is_group:
-        print(json.dumps(inst.is_group(args.is_group)))
-    elif args.is_field:
-        print(json.dumps(inst.is_field(args.is_field)))
-    sys.exit(0)
+    main(ARGS)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Persistent server for hdf5-viewer.
+
+Keeps HDF5 files open between queries so that repeated requests on the
+same file skip the cost of reopening it.  Listens on the Unix socket
+given by `h5parse.socket_path'.  Each request is one line of JSON,
+
+    {"cmd": "get_fields", "file": "/abs/path.h5", "arg": "/group"}
+
+with an optional "fast": true to skip data ranges, and is answered
+with one line of JSON, either {"result": ...} or {"error": "message"}."""
+
+# Copyright (C) 2024-2025 Paul Minner, Peter Mao, Caltech
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+
+from h5parse import H5Instance, dispatch, dumps_json, socket_path
+
+class FileCache:
+    """LRU cache of open H5Instances, keyed by filename."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    def query(self, filename: str, cmd: str, arg: str, fast: bool) -> dict:
+        """Run CMD on FILENAME, opening the file if it is not cached."""
+        with self.lock:
+            stat = os.stat(filename)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            entry = self.files.pop(filename, None)
+            if entry is not None and entry[0] != stamp:
+                # file changed on disk since it was opened
+                entry[1].close()
+                entry = None
+            if entry is None:
+                entry = (stamp, H5Instance(filename))
+            self.files[filename] = entry
+            while len(self.files) > self.maxsize:
+                _, (_, old) = self.files.popitem(last=False)
+                old.close()
+            return dispatch(entry[1], cmd, arg, fast)
+
+    def close(self):
+        with self.lock:
+            for _, inst in self.files.values():
+                inst.close()
+            self.files.clear()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answer newline-delimited JSON requests until the client hangs up."""
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                result = self.server.cache.query(request['file'],
+                                                 request['cmd'],
+                                                 request['arg'],
+                                                 request.get('fast', False))
+                response = {'result': result}
+            except Exception as err:
+                response = {'error': f"{type(err).__name__}: {err}"}
+            self.wfile.write(dumps_json(response) + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, maxsize: int):
+        self.cache = FileCache(maxsize)
+        super().__init__(path, RequestHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket'   , type=str, default=socket_path(),
+                        help='Unix socket to listen on')
+    parser.add_argument('--max-files', type=int, default=32,
+                        help='Number of HDF5 files to keep open')
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(args.socket)
+                sys.exit(f"A daemon is already listening on {args.socket}")
+            except ConnectionRefusedError:
+                os.unlink(args.socket) # stale socket from a dead daemon
+    os.umask(0o077) # only this user may connect
+    server = Server(args.socket, args.max_files)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.cache.close()
+        os.unlink(args.socket)
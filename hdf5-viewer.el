@@ -49,6 +49,33 @@
   :type 'string
   :group 'hdf5-viewer)
 
+(makunbound 'hdf5-viewer-daemon-command)
+(defcustom hdf5-viewer-daemon-command
+  (format "%s %sh5parse_daemon.py"
+          hdf5-viewer-python-command
+          (file-name-directory (or load-file-name (buffer-file-name))))
+  "Shell command to launch h5parse_daemon.py script."
+  :type 'string
+  :group 'hdf5-viewer)
+
+(defcustom hdf5-viewer-use-daemon nil
+  "Send queries to a running h5parse daemon if non-nil.
+
+The daemon keeps HDF5 files open between queries, which makes
+navigating large files much faster.  Start it with
+`hdf5-viewer-start-daemon'.  Queries fall back to running
+h5parse.py when no daemon is listening."
+  :type 'boolean
+  :group 'hdf5-viewer)
+
+(defcustom hdf5-viewer-show-range t
+  "Show the range of each dataset when listing a group if non-nil.
+
+Computing the range reads every dataset in the group, which can be
+slow for groups of large datasets."
+  :type 'boolean
+  :group 'hdf5-viewer)
+
 (defvar hdf5-viewer-mode-map
   (let ((map (make-sparse-keymap)))
     (define-key map (kbd "RET") 'hdf5-viewer-read-field-at-cursor)
@@ -101,6 +128,17 @@ Saves buffer positions when navigating backwards.")
         (setq npath "/"))
     npath))
 
+(defun hdf5-viewer--format-shape (meta)
+  "Return the dataset shape in parser output META for display.
+
+The parser gives the shape as a list of dimensions, or null for
+scalars.  Return an empty string if META has no shape."
+  (let ((shape (gethash "shape" meta 'none)))
+    (cond ((eq shape 'none) "")
+          ((null shape) "scalar")
+          ((null (cdr shape)) (format "(%d,)" (car shape)))
+          (t (format "(%s)" (mapconcat #'number-to-string shape ", "))))))
+
 (defun hdf5-viewer--get-field-at-cursor ()
   "Return field (group or dataset) at cursor position.
 
@@ -121,24 +159,93 @@ Return nil if there is nothing on this line."
   (let ((output (hdf5-viewer--run-parser "--is-field" field hdf5-viewer-file)))
     (gethash "return" output)))
 
+(defun hdf5-viewer--read-json ()
+  "Read parser json output from the start of the current buffer."
+  (goto-char (point-min))
+  (condition-case nil
+      (let ((json-array-type 'list)
+            (json-object-type 'hash-table)
+            (json-false nil))
+        (json-read))
+    (json-readtable-error
+     (error "Failed to read parser output: Invalid JSON"))))
+
+(defun hdf5-viewer--daemon-socket ()
+  "Return the path of the socket served by h5parse_daemon.py."
+  (let ((rundir (getenv "XDG_RUNTIME_DIR")))
+    (if (and rundir (not (string-empty-p rundir)))
+        (expand-file-name "hdf5-viewer.sock" rundir)
+      (format "/tmp/hdf5-viewer-%d.sock" (user-uid)))))
+
+(defun hdf5-viewer-start-daemon ()
+  "Start h5parse_daemon.py in the background."
+  (interactive)
+  (let ((proc (start-process-shell-command "hdf5-viewer-daemon"
+                                           " *hdf5-viewer-daemon*"
+                                           hdf5-viewer-daemon-command)))
+    (set-process-query-on-exit-flag proc nil)
+    proc))
+
+(defun hdf5-viewer--query-daemon (flag arg file &rest options)
+  "Send query FLAG with argument ARG on FILE to the h5parse daemon.
+
+OPTIONS may contain \"--fast\" to skip dataset ranges.  Return the
+daemon response, or nil if no daemon is listening."
+  (let ((socket (hdf5-viewer--daemon-socket))
+        (cmd (string-replace "-" "_" (string-remove-prefix "--" flag))))
+    (when (file-exists-p socket)
+      (with-temp-buffer
+        (let ((proc (condition-case nil
+                        (make-network-process :name "hdf5-viewer-query"
+                                              :family 'local
+                                              :service socket
+                                              :buffer (current-buffer)
+                                              :coding 'utf-8
+                                              :noquery t)
+                      (file-error nil))))
+          (when proc
+            (unwind-protect
+                (progn
+                  (process-send-string
+                   proc (concat (json-encode
+                                 `((cmd  . ,cmd) (file . ,file) (arg . ,arg)
+                                   (fast . ,(if (member "--fast" options) t :json-false))))
+                                "\n"))
+                  ;; responses are a single line of json
+                  (while (and (process-live-p proc)
+                              (not (progn (goto-char (point-min))
+                                          (search-forward "\n" nil t))))
+                    (accept-process-output proc 1))
+                  (and (> (buffer-size) 0)
+                       (hdf5-viewer--read-json)))
+              (delete-process proc))))))))
+
 (defun hdf5-viewer--run-parser (&rest args)
-  "Run parser command with custom ARGS and return json output."
-  (with-temp-buffer
-    (let ((exit-code
-           (apply #'call-process-shell-command
-                  hdf5-viewer-parse-command nil t nil args)))
-      (if (= exit-code 0)
-          (progn
-            (goto-char (point-min))
-            (condition-case nil
-                (let ((json-array-type 'list)
-                      (json-object-type 'hash-table)
-                      (json-false nil))
-                  (json-read))
-              (json-readtable-error
-               (error "Failed to read parser output: Invalid JSON"))))
-        (error "Parser script failed: %s"
-               (buffer-substring (point-min) (point-max)))))))
+  "Run parser command with custom ARGS and return json output.
+
+ARGS are the query flag, its argument, the HDF5 file and any extra
+option flags.  The query goes to the h5parse daemon when
+`hdf5-viewer-use-daemon' is non-nil and a daemon is listening."
+  (let ((response (and hdf5-viewer-use-daemon
+                       (apply #'hdf5-viewer--query-daemon args))))
+    (cond ((null response)
+           (with-temp-buffer
+             (let ((exit-code
+                    (call-process-shell-command
+                     (mapconcat #'identity
+                                ;; the daemon, if wanted, was asked above
+                                (cons hdf5-viewer-parse-command
+                                      (mapcar #'shell-quote-argument
+                                              (append args '("--no-daemon"))))
+                                " ")
+                     nil t nil)))
+               (if (= exit-code 0)
+                   (hdf5-viewer--read-json)
+                 (error "Parser script failed: %s"
+                        (buffer-substring (point-min) (point-max)))))))
+          ((gethash "error" response)
+           (error "Parser daemon failed: %s" (gethash "error" response)))
+          (t (gethash "result" response)))))
 
 (defun hdf5-viewer-back ()
   "Go back one group level and display to screen."
@@ -161,7 +268,9 @@ DIRECTION indicates which way we are navigating the heirarchy:
     (insert (format "%s %s\n\n"
                     (propertize "Root:" 'face 'bold)
                     hdf5-viewer-root))
-    (let* ((output (hdf5-viewer--run-parser "--get-fields" hdf5-viewer-root hdf5-viewer-file))
+    (let* ((output (apply #'hdf5-viewer--run-parser
+                          "--get-fields" hdf5-viewer-root hdf5-viewer-file
+                          (unless hdf5-viewer-show-range '("--fast"))))
            (attrs  (hdf5-viewer--run-parser "--get-attrs"  hdf5-viewer-root hdf5-viewer-file))
            (num-attrs (hash-table-count attrs))
            (field-template "%-8s %-15s %20s  %-30s\n")
@@ -177,7 +286,7 @@ DIRECTION indicates which way we are navigating the heirarchy:
                                           (format "%s/" key))))
                          ((string= type "dataset")
                           (let ((dtype (gethash "dtype" val))
-                                (shape (gethash "shape" val))
+                                (shape (hdf5-viewer--format-shape val))
                                 (range (gethash "range" val "")))
                             (insert (format field-template
                                             dtype shape range key))))
@@ -190,7 +299,7 @@ DIRECTION indicates which way we are navigating the heirarchy:
         (insert (propertize (format attr-template "*value*" "*attribute*")
                             'face '('bold 'underline)))
         (maphash (lambda (attrkey attrval)
-                   (let ((attrval-substrings (split-string attrval "\n")))
+                   (let ((attrval-substrings (split-string (format "%s" attrval) "\n")))
                      ;; print `attrkey' on this line
                      (insert (format attr-template (pop attrval-substrings) attrkey))
                      ;; if `attrval' breaks over multiple lines, print remainder w/o key
@@ -234,11 +343,12 @@ DIRECTION indicates which way we are navigating the heirarchy:
   (when (hdf5-viewer--is-field field)
     (let ((field  (hdf5-viewer--fix-path field))
           (output (hdf5-viewer--run-parser "--preview-field" field hdf5-viewer-file)))
-      (message "%s %s %s:\n%s"
+      (message "%s %s %s:\n%s%s"
                (propertize field 'face 'bold)
-               (gethash "shape" output "")
+               (hdf5-viewer--format-shape output)
                (gethash "dtype" output "")
-               (gethash "data" output)))))
+               (gethash "data" output)
+               (if (gethash "truncated" output) "\n..." "")))))
 
 (defun hdf5-viewer-read-field-at-cursor ()
   "Display field contents at cursor in new buffer."
@@ -271,7 +381,7 @@ DIRECTION indicates which way we are navigating the heirarchy:
               (setq-local truncate-lines t)
               (insert (propertize (format "%s %s %s:"
                                           (propertize field 'face 'bold)
-                                          (gethash "shape" output)
+                                          (hdf5-viewer--format-shape output)
                                           (gethash "dtype" output)) 'face 'underline))
               (insert "\n\n" (gethash "data" output))
               (goto-char (point-min))
@@ -315,7 +425,7 @@ HDF5 filename with \"-hdf5-viewer\" appended to the end."
                         (set-buffer-multibyte nil)
                         (insert-file-contents-literally filename nil 0 8 t)
                         (buffer-substring-no-properties 1 9)))
-            (filename-escaped (shell-quote-argument (expand-file-name filename))))
+            (filename-expanded (expand-file-name filename)))
         (when (string= filehead hdf5-signature)
           (let* ((this-buffer-filename (concat filename "-hdf5-viewer"))
                  (this-buffer-name (format "*hdf5: %s*" (file-name-nondirectory filename)))
@@ -325,7 +435,7 @@ HDF5 filename with \"-hdf5-viewer\" appended to the end."
               (let ((new-buffer-name (generate-new-buffer-name this-buffer-name)))
                 (switch-to-buffer (get-buffer-create new-buffer-name))
                 (setq default-directory (file-name-directory filename))
-                (setq hdf5-viewer--buffer-filename filename-escaped)
+                (setq hdf5-viewer--buffer-filename filename-expanded)
                 (set-visited-file-name this-buffer-filename)
                 (rename-buffer new-buffer-name)
                 (hdf5-viewer-mode))))